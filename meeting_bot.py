@@ -1,22 +1,33 @@
 import asyncio
+import atexit
+import bisect
 import calendar
+import heapq
 import json
+import logging
+import logging.handlers
 import os
+import queue
 import re
 import shutil
 import subprocess
+import sys
 import tempfile
+import threading
 import warnings
+from collections import Counter, defaultdict, namedtuple
 from datetime import datetime, timedelta
+from functools import lru_cache
 from zoneinfo import ZoneInfo
 
-import dateparser
 import gspread
 from dotenv import load_dotenv
+from google.auth.transport.requests import AuthorizedSession
 from google.oauth2.service_account import Credentials
 from PIL import Image
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfgen import canvas
+from requests.adapters import HTTPAdapter
 from telegram import (
     Bot,
     BotCommand,
@@ -24,7 +35,6 @@ from telegram import (
     BotCommandScopeDefault,
     InlineKeyboardButton,
     InlineKeyboardMarkup,
-    InputFile,
     ReplyKeyboardRemove,
     Update,
 )
@@ -45,6 +55,20 @@ from telegram.warnings import PTBUserWarning
 load_dotenv()
 warnings.simplefilter("ignore", PTBUserWarning)
 
+# Handlers only enqueue log records; a listener thread writes them to stdout, so a slow
+# or blocked pipe never stalls the event loop
+log_queue: queue.Queue = queue.Queue(-1)
+log_output = logging.StreamHandler(sys.stdout)
+log_output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+log_listener = logging.handlers.QueueListener(log_queue, log_output)
+log_listener.start()
+atexit.register(log_listener.stop)
+
+logger = logging.getLogger("meeting_bot")
+logger.setLevel(logging.INFO)
+logger.addHandler(logging.handlers.QueueHandler(log_queue))
+logger.propagate = False
+
 # ===================== CONFIG =====================
 TOKEN = os.getenv("BOT_TOKEN")
 SPREADSHEET_URL = os.getenv("SPREADSHEET_URL")
@@ -62,6 +86,22 @@ if not SPREADSHEET_URL:
 GROUP_CHAT_ID = int(os.getenv("GROUP_CHAT_ID"))
 ADMIN_ID = int(os.getenv("ADMIN_ID"))
 
+# Local timezone for all booking dates/times (resolved once at import)
+TZ = ZoneInfo("Asia/Phnom_Penh")
+
+# Booking time input 'HH:MM-HH:MM'; hour/minute ranges are validated by the pattern itself
+TIME_RANGE_RE = re.compile(r"([01]?\d|2[0-3]):[0-5]\d\s*-\s*([01]?\d|2[0-3]):[0-5]\d")
+
+# Characters replaced with '_' in uploaded/output PDF filenames
+UNSAFE_FILENAME_RE = re.compile(r"[^A-Za-z0-9._-]")
+
+# Seconds to wait for more bookings before announcing them to the group in one message
+ANNOUNCE_DELAY = 2.0
+
+# Seconds before retrying a failed auto_cleanup, doubled per consecutive failure up to the cap
+CLEANUP_RETRY_DELAY = 300
+CLEANUP_MAX_DELAY = 3600
+
 # In-memory store for cancellation details (keyed by timestamp string)
 cancel_details_store: dict = {}
 
@@ -78,7 +118,7 @@ CONVERT_TO_PDF = 301
 os.makedirs("docs", exist_ok=True)
 if not os.listdir("docs"):
     open("docs/.keep", "w").close()
-print("✅ 'docs' folder ready (auto-created if missing).")
+logger.info("✅ 'docs' folder ready (auto-created if missing).")
 
 # ===================== GOOGLE SHEETS =====================
 SCOPES = [
@@ -91,41 +131,75 @@ try:
 except (TypeError, json.JSONDecodeError) as e:
     raise ValueError(f"❌ GOOGLE_CREDENTIALS is missing or contains invalid JSON: {e}") from e
 creds = Credentials.from_service_account_info(creds_json, scopes=SCOPES)
-client = gspread.authorize(creds)
-sheet = client.open_by_url(SPREADSHEET_URL).sheet1
-spreadsheet = client.open_by_url(SPREADSHEET_URL)
-try:
-    stats_sheet = spreadsheet.worksheet("UserStats")
-except gspread.exceptions.WorksheetNotFound:
-    stats_sheet = spreadsheet.add_worksheet(
-        title="UserStats", rows="1000", cols="4")
-    stats_sheet.append_row(["TelegramID", "Name", "Command", "DateTime"])
+
+# Keep-alive pool sized for concurrent asyncio.to_thread Sheets calls
+sheets_session = AuthorizedSession(creds)
+sheets_session.mount("https://", HTTPAdapter(pool_connections=8, pool_maxsize=32))
+
+
+class _Services:
+    """Spreadsheet and worksheet handles, opened on first use rather than at import."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._handles = None
+
+    def _open(self) -> tuple:
+        # Open the workbook once by key and resolve both worksheets from a single metadata fetch
+        with self._lock:
+            if self._handles is None:
+                client = gspread.Client(auth=creds, session=sheets_session)
+                spreadsheet = client.open_by_key(gspread.utils.extract_id_from_url(SPREADSHEET_URL))
+                worksheets = spreadsheet.worksheets()
+                stats_sheet = next((ws for ws in worksheets if ws.title == "UserStats"), None)
+                if stats_sheet is None:
+                    stats_sheet = spreadsheet.add_worksheet(
+                        title="UserStats", rows="1000", cols="4")
+                    stats_sheet.append_row(["TelegramID", "Name", "Command", "DateTime"])
+                self._handles = (spreadsheet, worksheets[0], stats_sheet)
+                logger.info("✅ Connected to Google Sheets.")
+        return self._handles
+
+    @property
+    def spreadsheet(self) -> gspread.Spreadsheet:
+        return self._open()[0]
+
+    @property
+    def sheet(self) -> gspread.Worksheet:
+        """The bookings worksheet (first tab)."""
+        return self._open()[1]
+
+    @property
+    def stats_sheet(self) -> gspread.Worksheet:
+        """The 'UserStats' worksheet, created with headers if missing."""
+        return self._open()[2]
+
+
+services = _Services()
 
 # ===================== HELPERS =====================
 
+# Bookings sheet columns (A:D); each data row is held as a Booking of strings
+HEADERS = ("Date", "Time", "Name", "TelegramID")
+Booking = namedtuple("Booking", "date time name telegram_id")
 
-def sort_key(row):
-    """Reusable sort key: parse Date and start Time; fallback to max values."""
-    try:
-        date_obj = datetime.strptime(row["Date"], "%d/%m/%Y")
-        time_start = row["Time"].split(
-            "-")[0] if "-" in row["Time"] else row["Time"]
-        time_obj = datetime.strptime(time_start.strip(), "%H:%M")
-        return (date_obj, time_obj)
-    except Exception:
-        return (datetime.max, datetime.max)
+# Google Sheets serial dates count days from this epoch
+SHEET_EPOCH = datetime(1899, 12, 30)
 
 
-async def log_user_action(user, command):
-    """Log each user command to the 'UserStats' sheet (Phnom Penh time)."""
-    try:
-        now = datetime.now(ZoneInfo("Asia/Phnom_Penh"))
-        now_str = now.strftime("%d/%m/%Y %H:%M:%S")
-        await asyncio.to_thread(
-            stats_sheet.append_row, [str(user.id), user.first_name, command, now_str])
-        print(f"✅ Logged {command} by {user.first_name} at {now_str}")
-    except Exception as e:
-        print(f"⚠️ Could not log action: {e}")
+def fetch_bookings() -> list[Booking]:
+    """Read data rows A2:D unformatted as Bookings; serial dates become 'DD/MM/YYYY'."""
+    values = services.sheet.get_values("A2:D", value_render_option="UNFORMATTED_VALUE")
+    if values == [[]]:
+        # gspread's gap filling returns one empty row for an empty range
+        return []
+    records = []
+    for row in values:
+        date_val, time_str, name, tid = (list(row) + [""] * len(HEADERS))[:len(HEADERS)]
+        if isinstance(date_val, (int, float)) and not isinstance(date_val, bool):
+            date_val = (SHEET_EPOCH + timedelta(days=date_val)).strftime("%d/%m/%Y")
+        records.append(Booking(str(date_val), str(time_str), str(name), str(tid)))
+    return records
 
 
 def time_to_minutes(time_str):
@@ -134,57 +208,371 @@ def time_to_minutes(time_str):
     return h * 60 + m
 
 
-def is_overlapping(existing_start, existing_end, new_start, new_end):
-    """Check if two time ranges overlap."""
-    return not (new_end <= existing_start or new_start >= existing_end)
+def parse_date(date_str: str) -> datetime:
+    """Parse 'DD/MM/YYYY' (a two-digit year means 20YY); raises ValueError like strptime."""
+    day, month, year = date_str.split("/")
+    year = year.strip()
+    if len(year) == 2:
+        year = "20" + year
+    elif len(year) != 4:
+        raise ValueError(f"year must have 2 or 4 digits: {date_str!r}")
+    return datetime(int(year), int(month), int(day))
+
+
+# In-memory mirror of the bookings sheet in sheet row order (row number = index + 2).
+# bookings_lock guards the in-memory state and is only held briefly, so the event loop
+# can read it. Writers also hold sheet_write_lock across their Sheets call, which keeps
+# sheet rows and the mirror changing in the same order.
+bookings: list[Booking] = []
+bookings_lock = threading.Lock()
+sheet_write_lock = threading.Lock()
+
+# Per-date slot index as parallel lists sorted by start: date -> (starts, ends) in minutes.
+# Rows typed into the sheet by hand may overlap, so ends are not guaranteed to be sorted.
+bookings_by_date: dict[str, tuple[list[int], list[int]]] = {}
+
+# Rows per TelegramID in sheet order, for /cancel and /end
+bookings_by_uid: dict[str, list[Booking]] = {}
+
+# Min-heap of (end_timestamp, date, time, telegram_id) for auto_cleanup. Canceled bookings
+# are left in place and skipped when popped; _set_bookings rebuilds it from scratch.
+expiry_heap: list[tuple] = []
+
+# Rendered 'Date | Time | Name' schedule; rebuilt by render_schedule() only after a change
+schedule_cache = {"text": "", "dirty": True}
+
+# Consecutive auto_cleanup failures; drives the retry backoff and is reset by a clean run
+cleanup_state = {"failures": 0}
+
+# Booked 'HH:MM-HH:MM' lines per date for /available; an entry is dropped when its date changes
+available_cache: dict[str, str] = {}
+
+
+def _slot_from_row(row: Booking) -> tuple | None:
+    """Parse a booking row's time into its (start_min, end_min) slot."""
+    try:
+        start_str, end_str = row.time.split("-")
+        return time_to_minutes(start_str.strip()), time_to_minutes(end_str.strip())
+    except ValueError:
+        return None
+
+
+def local_timestamp(date_str: str, minutes: int) -> int:
+    """Epoch seconds for a DD/MM/YYYY date plus minutes past local midnight (no DST in TZ)."""
+    day = parse_date(date_str).replace(tzinfo=TZ)
+    return int(day.timestamp()) + minutes * 60
+
+
+def _index_booking(row: Booking):
+    """Add a row to bookings_by_uid, bookings_by_date and expiry_heap (caller holds bookings_lock)."""
+    bookings_by_uid.setdefault(row.telegram_id, []).append(row)
+    slot = _slot_from_row(row)
+    if not slot:
+        return
+    available_cache.pop(row.date, None)
+    starts, ends = bookings_by_date.setdefault(row.date, ([], []))
+    i = bisect.bisect_right(starts, slot[0])
+    starts.insert(i, slot[0])
+    ends.insert(i, slot[1])
+    try:
+        end_ts = local_timestamp(row.date, slot[1])
+    except ValueError:
+        return
+    heapq.heappush(expiry_heap, (end_ts, row.date, row.time, row.telegram_id))
+
+
+def _unindex_booking(row: Booking):
+    """Remove a row from bookings_by_uid and bookings_by_date (caller holds bookings_lock)."""
+    user_rows = bookings_by_uid.get(row.telegram_id)
+    if user_rows and row in user_rows:
+        user_rows.remove(row)
+        if not user_rows:
+            del bookings_by_uid[row.telegram_id]
+    slot = _slot_from_row(row)
+    if not slot or row.date not in bookings_by_date:
+        return
+    available_cache.pop(row.date, None)
+    starts, ends = bookings_by_date[row.date]
+    i = bisect.bisect_left(starts, slot[0])
+    while i < len(starts) and starts[i] == slot[0]:
+        if ends[i] == slot[1]:
+            del starts[i], ends[i]
+            break
+        i += 1
+    if not starts:
+        del bookings_by_date[row.date]
+
+
+def _set_bookings(rows: list[Booking]):
+    """Replace the mirror and rebuild the per-date index (caller holds bookings_lock)."""
+    bookings[:] = rows
+    schedule_cache["dirty"] = True
+    bookings_by_uid.clear()
+    bookings_by_date.clear()
+    expiry_heap.clear()
+    available_cache.clear()
+    for row in bookings:
+        _index_booking(row)
+
+
+def _resync_bookings() -> list[Booking]:
+    """Re-read the sheet into the mirror and return the rows (caller holds sheet_write_lock)."""
+    rows = fetch_bookings()
+    with bookings_lock:
+        _set_bookings(rows)
+    return rows
+
+
+def reload_bookings():
+    """Re-read the sheet into the in-memory mirror (picks up manual edits)."""
+    with sheet_write_lock:
+        _resync_bookings()
+
+
+def _appended_row_number(response) -> int | None:
+    """Sheet row number written by append_row, from its 'updatedRange' (e.g. 'Sheet1!A7:D7')."""
+    try:
+        first_cell = response["updates"]["updatedRange"].split("!")[-1].split(":")[0]
+        return gspread.utils.a1_to_rowcol(first_cell)[0]
+    except (KeyError, TypeError, IndexError, gspread.exceptions.IncorrectCellLabel):
+        return None
+
+
+def get_bookings() -> list[Booking]:
+    """Return a snapshot of the cached bookings in sheet order."""
+    with bookings_lock:
+        return list(bookings)
+
+
+def get_user_bookings(telegram_id) -> list[Booking]:
+    """Return a snapshot of one user's cached bookings in sheet order."""
+    with bookings_lock:
+        return list(bookings_by_uid.get(str(telegram_id), ()))
+
+
+def _append_booking_sync(date_str, time_str, name, telegram_id, new_start, new_end) -> str:
+    """Append a booking to the sheet and mirror unless it overlaps an existing one."""
+    with sheet_write_lock:
+        with bookings_lock:
+            # Only slots starting before new_end can overlap; one of them must end after new_start
+            starts, ends = bookings_by_date.get(date_str, ([], []))
+            i = bisect.bisect_left(starts, new_end)
+            if i and max(ends[:i]) > new_start:
+                return "overlap"
+
+        row = Booking(date_str, time_str, name, str(telegram_id))
+        response = services.sheet.append_row(list(row))
+        with bookings_lock:
+            # The mirror stays positional only if the row landed right after its last entry
+            in_place = _appended_row_number(response) == len(bookings) + 2
+            if in_place:
+                bookings.append(row)
+                _index_booking(row)
+                schedule_cache["dirty"] = True
+        if not in_place:
+            # The sheet was edited by hand since the last refresh
+            _resync_bookings()
+    return "success"
+
+
+def _delete_booking_sync(telegram_id, date_str, time_str) -> bool:
+    """Delete the user's booking, resolving its current sheet row under the write lock."""
+    key = (date_str, time_str, str(telegram_id))
+    with sheet_write_lock:
+        # The mirror may predate manual sheet edits, so resolve the row from a fresh read
+        rows = _resync_bookings()
+        index = next(
+            (i for i, (d, t, _, tid) in enumerate(rows) if (d, t, tid) == key), None)
+        if index is None:
+            return False
+        services.sheet.delete_rows(index + 2)
+        with bookings_lock:
+            _unindex_booking(bookings.pop(index))
+            schedule_cache["dirty"] = True
+    return True
+
+
+def sort_key(row):
+    """Reusable sort key: parse Date and start Time; fallback to max values."""
+    return _sort_tuple(row.date, row.time)
+
+
+@lru_cache(maxsize=4096)
+def _sort_tuple(date_str: str, time_str: str) -> tuple:
+    # Dates and slot times repeat across rows, so each pair is parsed only once
+    try:
+        time_start = time_str.split("-")[0]
+        return (parse_date(date_str), time_to_minutes(time_start.strip()))
+    except ValueError:
+        return (datetime.max, 0)
+
+
+def _format_minutes(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def booked_ranges(date_str: str) -> str:
+    """Return the date's booked 'HH:MM-HH:MM' lines ('' if free), cached per date."""
+    with bookings_lock:
+        text = available_cache.get(date_str)
+        if text is None:
+            starts, ends = bookings_by_date.get(date_str, ([], []))
+            text = "".join(
+                f"{_format_minutes(s)}-{_format_minutes(e)}\n" for s, e in zip(starts, ends))
+            available_cache[date_str] = text
+        return text
+
+
+def render_schedule() -> str:
+    """Return the cached bookings as sorted 'Date | Time | Name' lines ('' if none)."""
+    with bookings_lock:
+        if schedule_cache["dirty"]:
+            ordered = sorted(bookings, key=sort_key)
+            schedule_cache["text"] = "".join(
+                f"{date} | {time} | {name}\n" for date, time, name, _ in ordered)
+            schedule_cache["dirty"] = False
+        return schedule_cache["text"]
+
+
+# UserStats rows waiting to be written in one append_rows call by flush_logs
+pending_logs: list[list[str]] = []
+logs_lock = threading.Lock()
+
+# Per-user /stats summary: name -> {"total", "actions", "last_action"}, kept up to date by
+# log_user_action after being seeded once from the 'UserStats' sheet (guarded by logs_lock)
+stats_summary: defaultdict[str, dict] = defaultdict(
+    lambda: {"total": 0, "actions": Counter(), "last_action": ""})
+
+
+def _count_action(name: str, action: str, when: str):
+    """Add one logged action to stats_summary (caller holds logs_lock)."""
+    info = stats_summary[name]
+    info["total"] += 1
+    info["last_action"] = when
+    info["actions"][action] += 1
+
+
+@lru_cache(maxsize=1024)
+def _parse_action_time(when: str) -> datetime:
+    """Parse a 'DD/MM/YYYY HH:MM:SS' log timestamp for sorting; datetime.min if malformed."""
+    try:
+        return datetime.strptime(when, "%d/%m/%Y %H:%M:%S")
+    except ValueError:
+        return datetime.min
+
+
+def load_stats_summary():
+    """Seed stats_summary from every row already in the 'UserStats' sheet."""
+    # UserStats columns: TelegramID, Name, Command, DateTime
+    rows = services.stats_sheet.get_all_values()[1:]
+    with logs_lock:
+        stats_summary.clear()
+        for row in rows:
+            _count_action(row[1], row[2], row[3])
+
+
+def log_user_action(user, command):
+    """Queue each user command for the 'UserStats' sheet (Phnom Penh time); never blocks on I/O."""
+    now = datetime.now(TZ)
+    now_str = now.strftime("%d/%m/%Y %H:%M:%S")
+    with logs_lock:
+        pending_logs.append([str(user.id), user.first_name, command, now_str])
+        _count_action(user.first_name, command, now_str)
+    logger.info("✅ Logged %s by %s at %s", command, user.first_name, now_str)
+
+
+def _flush_logs_sync() -> int:
+    """Write all queued log rows to 'UserStats'; rows are re-queued on failure."""
+    with logs_lock:
+        rows = pending_logs[:]
+        pending_logs.clear()
+    if not rows:
+        return 0
+
+    try:
+        services.stats_sheet.append_rows(rows, value_input_option="RAW")
+    except Exception:
+        with logs_lock:
+            pending_logs[:0] = rows
+        raise
+    return len(rows)
+
+
+async def flush_logs(context: ContextTypes.DEFAULT_TYPE = None):
+    """Flush queued user actions to the sheet (JobQueue callback and shutdown hook)."""
+    try:
+        count = await asyncio.to_thread(_flush_logs_sync)
+        if count:
+            logger.info("✅ Flushed %s logged actions to UserStats", count)
+    except Exception as e:
+        logger.warning("⚠️ Could not log actions: %s", e)
 
 
 async def save_booking(date_str, time_str, name, telegram_id):
     """Save a booking only if the time range does not overlap with existing ones."""
     try:
-        new_start_str, new_end_str = time_str.split("-")
-        new_start = time_to_minutes(new_start_str.strip())
-        new_end = time_to_minutes(new_end_str.strip())
+        new_start_str, new_end_str = [t.strip() for t in time_str.split("-")]
+        new_start = time_to_minutes(new_start_str)
+        new_end = time_to_minutes(new_end_str)
     except ValueError:
         # Invalid time format
         return "invalid"
+    time_str = f"{new_start_str}-{new_end_str}"
 
-    records = await asyncio.to_thread(sheet.get_all_records)
-    for row in records:
-        if row.get("Date") == date_str:
-            try:
-                exist_start_str, exist_end_str = row["Time"].split("-")
-                exist_start = time_to_minutes(exist_start_str.strip())
-                exist_end = time_to_minutes(exist_end_str.strip())
-
-                if is_overlapping(exist_start, exist_end, new_start, new_end):
-                    return "overlap"
-            except Exception:
-                continue
-
-    # If no overlap → save
-    await asyncio.to_thread(sheet.append_row, [date_str, time_str, name, str(telegram_id)])
-    return "success"
+    # Overlap check and append run together under the bookings lock
+    return await asyncio.to_thread(
+        _append_booking_sync, date_str, time_str, name, telegram_id, new_start, new_end)
 
 
 async def cancel_booking(telegram_id, date_str, time_str):
-    records = await asyncio.to_thread(sheet.get_all_records)
-    for i, row in enumerate(records, start=2):
-        if (
-            row.get("TelegramID") == str(telegram_id)
-            and row.get("Date") == date_str
-            and row.get("Time") == time_str
-        ):
-            await asyncio.to_thread(sheet.delete_rows, i)
-            return True
-    return False
+    """Delete a booking by owner, date and time; False if it no longer exists."""
+    return await asyncio.to_thread(_delete_booking_sync, telegram_id, date_str, time_str)
+
+
+async def announce_to_group(context: ContextTypes.DEFAULT_TYPE, text: str, **kwargs) -> bool:
+    """Send a Markdown message to the group; failures are logged instead of raised."""
+    try:
+        await context.bot.send_message(
+            chat_id=GROUP_CHAT_ID, text=text, parse_mode="Markdown", **kwargs)
+        return True
+    except Exception as e:
+        logger.warning("⚠️ Could not send group message: %s", e)
+        return False
+
+
+# New bookings waiting for announce_new_bookings; a burst shares one group message
+pending_announcements: list[str] = []
+
+
+def schedule_booking_announcement(context: ContextTypes.DEFAULT_TYPE, name: str, date_str: str, time_str: str):
+    """Queue a 'New Booking Added' entry, opening an ANNOUNCE_DELAY window if none is pending."""
+    pending_announcements.append(f"👤 {name}\n🗓 {date_str} | ⏰ {time_str}\n")
+    if not context.job_queue.get_jobs_by_name("announce_bookings"):
+        context.job_queue.run_once(announce_new_bookings, when=ANNOUNCE_DELAY, name="announce_bookings")
+
+
+async def announce_new_bookings(context: ContextTypes.DEFAULT_TYPE):
+    """Announce all queued bookings with one sorted schedule (JobQueue callback)."""
+    entries = pending_announcements[:]
+    pending_announcements.clear()
+    if not entries:
+        return
+
+    title = "📢 *New Booking Added!*" if len(entries) == 1 else "📢 *New Bookings Added!*"
+    message = (
+        f"{title}\n\n"
+        + "\n".join(entries)
+        + f"\n📋 *Current Schedule:*\n{render_schedule()}"
+    )
+    if await announce_to_group(context, message):
+        logger.info("✅ Group message with sorted schedule sent for %s booking(s).", len(entries))
 
 # ===================== BOT COMMANDS =====================
 
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.message.from_user
-    await log_user_action(user, "/start")
+    log_user_action(user, "/start")
 
     # Get admin info
     try:
@@ -200,6 +588,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "/book - Book the meeting room\n"
         "/cancel - Cancel your booking\n"
         "/end - End the active meeting\n"
+        "/available - Show booked times (today or DD/MM/YYYY)\n"
         "/docs - Download available documents\n"
         "/topdf - Convert document/image to PDF\n\n"
         f"ℹ️ Created by {admin_username}"
@@ -208,9 +597,8 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def book(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.message.from_user
-    await log_user_action(user, "/book")
-    tz = ZoneInfo("Asia/Phnom_Penh")
-    now_pp = datetime.now(tz)
+    log_user_action(user, "/book")
+    now_pp = datetime.now(TZ)
     keyboard = _build_month_keyboard(now_pp)
 
     prompt_message = await update.message.reply_text(
@@ -226,10 +614,9 @@ async def handle_month_selection(update: Update, context: ContextTypes.DEFAULT_T
     await query.answer()
 
     data = query.data or ""
-    tz = ZoneInfo("Asia/Phnom_Penh")
 
     if data == "month:choose":
-        now_pp = datetime.now(tz)
+        now_pp = datetime.now(TZ)
         edited_message = await query.edit_message_text(
             "📅 Choose a month to book:",
             reply_markup=_build_month_keyboard(now_pp),
@@ -248,11 +635,11 @@ async def handle_month_selection(update: Update, context: ContextTypes.DEFAULT_T
         _remember_booking_prompt(edited_message, context)
         return SELECT_MONTH
 
-    day_keyboard = _build_day_keyboard(year, month, tz)
+    day_keyboard = _build_day_keyboard(year, month)
 
     # If no days are available (e.g., all past), show month picker again
     if len(day_keyboard.inline_keyboard) <= 1:  # only the back button exists
-        now_pp = datetime.now(tz)
+        now_pp = datetime.now(TZ)
         edited_message = await query.edit_message_text(
             "⚠️ No future days left in that month. Pick another month:",
             reply_markup=_build_month_keyboard(now_pp),
@@ -315,15 +702,15 @@ def _build_month_keyboard(now_pp: datetime) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(keyboard)
 
 
-def _build_day_keyboard(year: int, month: int, tz: ZoneInfo) -> InlineKeyboardMarkup:
+def _build_day_keyboard(year: int, month: int) -> InlineKeyboardMarkup:
     """Inline keyboard for available days; skips past days of current month."""
-    today = datetime.now(tz).date()
+    today = datetime.now(TZ).date()
     _, last_day = calendar.monthrange(year, month)
 
     rows = []
     row = []
     for day in range(1, last_day + 1):
-        date_obj = datetime(year, month, day, tzinfo=tz).date()
+        date_obj = datetime(year, month, day, tzinfo=TZ).date()
         if date_obj < today:
             continue
         row.append(InlineKeyboardButton(str(day), callback_data=f"day:{year}-{month:02d}-{day:02d}"))
@@ -358,7 +745,7 @@ def _normalize_pdf_source_name(original_name: str, fallback: str = "file") -> st
     name = os.path.basename(original_name or "").strip()
     if not name:
         name = fallback
-    return re.sub(r"[^A-Za-z0-9._-]", "_", name)
+    return UNSAFE_FILENAME_RE.sub("_", name)
 
 
 def _normalize_output_pdf_name(raw_name: str) -> str | None:
@@ -374,6 +761,12 @@ def _normalize_output_pdf_name(raw_name: str) -> str | None:
     return f"{stem}.pdf"
 
 
+def _read_file_bytes(path: str) -> bytes:
+    """Read a whole file; called via asyncio.to_thread so disk reads stay off the event loop."""
+    with open(path, "rb") as f:
+        return f.read()
+
+
 def _convert_image_to_pdf(source_path: str, output_pdf_path: str):
     """Convert a local image file to PDF (RGB)."""
     with Image.open(source_path) as img:
@@ -483,7 +876,7 @@ async def _delete_booking_prompt(context: ContextTypes.DEFAULT_TYPE):
     try:
         await context.bot.delete_message(chat_id=chat_id, message_id=message_id)
     except Exception as e:
-        print(f"⚠️ Could not delete booking prompt: {e}")
+        logger.warning("⚠️ Could not delete booking prompt: %s", e)
 
 # ----------------- Get Time & Save -----------------
 
@@ -493,19 +886,17 @@ async def get_time(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.message.from_user
     date_str = context.user_data.get("date")
 
-    if not re.match(r"^\d{1,2}:\d{2}\s*-\s*\d{1,2}:\d{2}$", time_input):
+    if not TIME_RANGE_RE.fullmatch(time_input):
         await update.message.reply_text("❌ Invalid time format. Use HH:MM-HH:MM (e.g. 09:00-10:30).")
         return TIME
 
     start_str, end_str = [t.strip() for t in time_input.split("-")]
-    try:
-        start_time = datetime.strptime(start_str, "%H:%M")
-        end_time = datetime.strptime(end_str, "%H:%M")
-    except ValueError:
-        await update.message.reply_text("❌ Invalid time values. Please check your input again.")
-        return TIME
+    # Store 'HH:MM-HH:MM' without the spaces the pattern tolerates around '-'
+    time_input = f"{start_str}-{end_str}"
+    start_m = time_to_minutes(start_str)
+    end_m = time_to_minutes(end_str)
 
-    if end_time <= start_time:
+    if end_m <= start_m:
         await update.message.reply_text("⚠️ End time must be later than start time.")
         return TIME
 
@@ -518,29 +909,12 @@ async def get_time(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ Could not save booking. Please try again.")
         return TIME
     elif result == "success":
-        await update.message.reply_text(f"✅ Booking confirmed for {date_str} at {time_input}.")
-
         _clear_booking_prompt(context)
+        schedule_next_cleanup(context.job_queue)
 
-        # Announce to group with sorted schedule
-        try:
-            records = await asyncio.to_thread(sheet.get_all_records)
-            records.sort(key=sort_key)
-
-            message = (
-                f"📢 *New Booking Added!*\n\n"
-                f"👤 {user.first_name}\n"
-                f"🗓 {date_str} | ⏰ {time_input}\n\n"
-                f"📋 *Current Schedule:*\n"
-            )
-
-            for row in records:
-                message += f"{row['Date']} | {row['Time']} | {row['Name']}\n"
-
-            await context.bot.send_message(chat_id=GROUP_CHAT_ID, text=message, parse_mode="Markdown")
-            print("✅ Group message with sorted schedule sent.")
-        except Exception as e:
-            print(f"⚠️ Could not send group message: {e}")
+        # Announce to group with sorted schedule, coalesced with other bookings in a burst
+        schedule_booking_announcement(context, user.first_name, date_str, time_input)
+        await update.message.reply_text(f"✅ Booking confirmed for {date_str} at {time_input}.")
 
         return ConversationHandler.END
 
@@ -548,63 +922,53 @@ async def get_time(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.message.from_user
-    await log_user_action(user, "/cancel")
-    records = await asyncio.to_thread(sheet.get_all_records)
-
+    log_user_action(user, "/cancel")
+    # Telegram rejects the whole keyboard if any callback_data exceeds 64 bytes, which a
+    # row typed into the sheet by hand could; those rows are left out of the menu
     user_bookings = [
-        (i + 2, row) for i, row in enumerate(records)
-        if str(row.get("TelegramID")) == str(user.id)
+        row for row in get_user_bookings(user.id)
+        if len(f"cancel:{row.date}|{row.time}".encode()) <= 64
     ]
 
     if not user_bookings:
         await update.message.reply_text("❌ You don’t have any bookings to cancel.")
         return ConversationHandler.END
 
-    message = "🗓 *Your Bookings:*\n\n"
-    for idx, (row_num, row) in enumerate(user_bookings, start=1):
-        message += f"{idx}. {row['Date']} | {row['Time']}\n"
-
-    message += "\nReply with the *number* of the booking you want to delete:"
-    await update.message.reply_text(message, parse_mode="Markdown")
+    keyboard = InlineKeyboardMarkup([
+        [InlineKeyboardButton(f"{idx}. {row.date} | {row.time}", callback_data=f"cancel:{row.date}|{row.time}")]
+        for idx, row in enumerate(user_bookings, start=1)
+    ])
+    await update.message.reply_text(
+        "🗓 *Your Bookings:*\n\nTap the booking you want to delete:",
+        parse_mode="Markdown",
+        reply_markup=keyboard,
+    )
 
-    context.user_data["user_bookings"] = user_bookings
     return CANCEL_SELECT
 
 
-async def delete_booking_by_number(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_input = update.message.text
-    user_bookings = context.user_data.get("user_bookings", [])
-    user = update.message.from_user
-
-    try:
-        choice = int(user_input)
-    except ValueError:
-        await update.message.reply_text("❌ Please enter a valid number.")
-        return CANCEL_SELECT
-
-    if not (1 <= choice <= len(user_bookings)):
-        await update.message.reply_text("❌ Invalid choice. Try again.")
-        return CANCEL_SELECT
+async def handle_cancel_selection(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
 
-    row_index, booking = user_bookings[choice - 1]
-    canceled_date = booking["Date"]
-    canceled_time = booking["Time"]
-    await asyncio.to_thread(sheet.delete_rows, row_index)
+    data = query.data or ""
+    user = query.from_user
+    # The button carries the booking itself, so an old menu can never hit a different row
+    canceled_date, _, canceled_time = data.split(":", 1)[-1].partition("|")
 
-    await update.message.reply_text(f"✅ Canceled booking on {canceled_date} at {canceled_time}.")
+    if not canceled_date or not canceled_time or not await cancel_booking(user.id, canceled_date, canceled_time):
+        await query.edit_message_text("⚠️ That booking is no longer available. Use /cancel again.")
+        return ConversationHandler.END
 
     # Build updated schedule message
-    records = await asyncio.to_thread(sheet.get_all_records)
-    if records:
-        records.sort(key=sort_key)
-        message = "📋 *Updated Schedule:*\n"
-        for row in records:
-            message += f"{row['Date']} | {row['Time']} | {row['Name']}\n"
+    schedule = render_schedule()
+    if schedule:
+        message = "📋 *Updated Schedule:*\n" + schedule
     else:
         message = "📋 No bookings left."
 
     # Store cancellation details for the inline button
-    detail_key = str(int(datetime.now(ZoneInfo("Asia/Phnom_Penh")).timestamp() * 1000))
+    detail_key = str(int(datetime.now(TZ).timestamp() * 1000))
     cancel_details_store[detail_key] = {
         "name": user.first_name,
         "user_id": user.id,
@@ -621,58 +985,66 @@ async def delete_booking_by_number(update: Update, context: ContextTypes.DEFAULT
         f"🗑️ *Booking Cancelled:*"
     )
 
-    try:
-        await context.bot.send_message(
-            chat_id=GROUP_CHAT_ID,
-            text=announcement,
-            parse_mode="Markdown",
-            reply_markup=detail_keyboard,
-        )
-    except Exception as e:
-        print(f"⚠️ Could not send group message: {e}")
+    await asyncio.gather(
+        query.edit_message_text(f"✅ Canceled booking on {canceled_date} at {canceled_time}."),
+        announce_to_group(context, announcement, reply_markup=detail_keyboard),
+    )
 
     return ConversationHandler.END
 
+# ----------------- Availability -----------------
+
+
+async def available(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user = update.message.from_user
+    log_user_action(user, "/available")
+
+    if context.args:
+        try:
+            date_str = parse_date(context.args[0]).strftime("%d/%m/%Y")
+        except ValueError:
+            await update.message.reply_text("❌ Invalid date. Use DD/MM/YYYY (e.g. 25/12/2025).")
+            return
+    else:
+        date_str = datetime.now(TZ).strftime("%d/%m/%Y")
+
+    booked = booked_ranges(date_str)
+    if booked:
+        await update.message.reply_text(
+            f"📅 *{date_str}*\n⛔ Booked:\n{booked}\n✅ All other times are free.",
+            parse_mode="Markdown",
+        )
+    else:
+        await update.message.reply_text(f"📅 {date_str}\n✅ The room is free all day.")
+
 # ----------------- End meeting -----------------
 
 
 async def end_meeting(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.message.from_user
-    await log_user_action(user, "/end")
+    log_user_action(user, "/end")
 
-    records = await asyncio.to_thread(sheet.get_all_records)
-    user_bookings = [
-        (i + 2, row) for i, row in enumerate(records)
-        if str(row.get("TelegramID")) == str(user.id)
-    ]
+    user_bookings = get_user_bookings(user.id)
 
     if not user_bookings:
         await update.message.reply_text("❌ You don’t have any active meetings to end.")
         return
 
-    tz = ZoneInfo("Asia/Phnom_Penh")
-    now = datetime.now(tz)
+    now_ts = int(datetime.now(TZ).timestamp())
 
     active_meeting = None
-    active_row_index = None
-
-    for row_index, booking in user_bookings:
-        date_str = booking["Date"]
-        time_str = booking["Time"]
-        start_str, end_str = [t.strip() for t in time_str.split("-")]
 
+    for booking in user_bookings:
         try:
-            start_dt = datetime.strptime(
-                f"{date_str} {start_str}", "%d/%m/%Y %H:%M").replace(tzinfo=tz)
-            end_dt = datetime.strptime(
-                f"{date_str} {end_str}", "%d/%m/%Y %H:%M").replace(tzinfo=tz)
-        except Exception as e:
-            print(f"⚠️ Error parsing time: {e}")
+            start_min, end_min = _slot_from_row(booking)
+            midnight_ts = local_timestamp(booking.date, 0)
+        except (TypeError, ValueError) as e:
+            logger.warning("⚠️ Error parsing time: %s", e)
             continue
 
-        if start_dt <= now <= end_dt + timedelta(minutes=30):
+        # Fixed UTC+7 offset: both ends are plain offsets from the day's local midnight
+        if midnight_ts + start_min * 60 <= now_ts <= midnight_ts + (end_min + 30) * 60:
             active_meeting = booking
-            active_row_index = row_index
             break
 
     if not active_meeting:
@@ -682,9 +1054,10 @@ async def end_meeting(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return
 
-    await asyncio.to_thread(sheet.delete_rows, active_row_index)
-    ended_date = active_meeting["Date"]
-    ended_time = active_meeting["Time"]
+    ended_date, ended_time = active_meeting[:2]
+    if not await cancel_booking(user.id, ended_date, ended_time):
+        await update.message.reply_text("⚠️ That meeting was already removed from the schedule.")
+        return
 
     message = (
         f"🏁 *Meeting Ended!*\n"
@@ -696,10 +1069,10 @@ async def end_meeting(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         await context.bot.send_message(chat_id=GROUP_CHAT_ID, text=message, parse_mode="Markdown")
         await update.message.reply_text("✅ Meeting ended and announced to the group.")
-        print(
-            f"✅ Meeting ended for {user.first_name}: {ended_date} {ended_time}")
+        logger.info(
+            "✅ Meeting ended for %s: %s %s", user.first_name, ended_date, ended_time)
     except Exception as e:
-        print(f"⚠️ Could not send group message: {e}")
+        logger.warning("⚠️ Could not send group message: %s", e)
         await update.message.reply_text("⚠️ Meeting ended but could not announce to group.")
 
 # ----------------- Stats -----------------
@@ -712,40 +1085,19 @@ async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     try:
-        spreadsheet = client.open_by_url(SPREADSHEET_URL)
-        stats_sheet = spreadsheet.worksheet("UserStats")
-        records = await asyncio.to_thread(stats_sheet.get_all_records)
-
-        if not records:
+        # Already includes actions still waiting in the log buffer
+        with logs_lock:
+            summary = {
+                name: {**info, "actions": Counter(info["actions"])}
+                for name, info in stats_summary.items()
+            }
+
+        if not summary:
             await update.message.reply_text("📊 No user activity data yet.")
             return
 
-        summary = {}
-        for row in records:
-            name = row["Name"]
-            action = row["Command"]
-            last_time = row["DateTime"]
-
-            if name not in summary:
-                summary[name] = {
-                    "total": 0,
-                    "actions": {},
-                    "last_action": last_time
-                }
-
-            summary[name]["total"] += 1
-            summary[name]["last_action"] = last_time
-            summary[name]["actions"][action] = summary[name]["actions"].get(
-                action, 0) + 1
-
-        def sort_key_stats(item):
-            try:
-                return datetime.strptime(item[1]["last_action"], "%d/%m/%Y %H:%M:%S")
-            except Exception:
-                return datetime.min
-
         sorted_users = sorted(
-            summary.items(), key=sort_key_stats, reverse=True)
+            summary.items(), key=lambda item: _parse_action_time(item[1]["last_action"]), reverse=True)
 
         def escape_md(text: str) -> str:
             """Escape special MarkdownV1 characters in dynamic text."""
@@ -753,11 +1105,13 @@ async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 text = text.replace(ch, f"\\{ch}")
             return text
 
-        message = "📊 *All User Activity Summary:*\n\n"
+        header = "📊 *All User Activity Summary:*\n\n"
+        continued_header = "📊 *All User Activity Summary (continued):*\n\n"
+        blocks = []
         for name, info in sorted_users:
             actions_text = ", ".join(
                 [f"{escape_md(cmd)}({count})" for cmd, count in info["actions"].items()])
-            message += (
+            blocks.append(
                 f"👤 *{escape_md(name)}*\n"
                 f"🕒 Last: {info['last_action']}\n"
                 f"📈 Total: {info['total']}\n"
@@ -766,34 +1120,24 @@ async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         # Split message if it exceeds Telegram's 4096-char limit
         max_len = 4096
-        if len(message) <= max_len:
-            await update.message.reply_text(message, parse_mode="Markdown")
-        else:
-            chunks = []
-            current = "📊 *All User Activity Summary (continued):*\n\n"
-            for name, info in sorted_users:
-                actions_text = ", ".join(
-                    [f"{escape_md(cmd)}({count})" for cmd, count in info["actions"].items()])
-                block = (
-                    f"👤 *{escape_md(name)}*\n"
-                    f"🕒 Last: {info['last_action']}\n"
-                    f"📈 Total: {info['total']}\n"
-                    f"📝 Actions: {actions_text}\n\n"
-                )
-                if len(current) + len(block) > max_len:
-                    chunks.append(current)
-                    current = "📊 *All User Activity Summary (continued):*\n\n" + block
-                else:
-                    current += block
-            if current.strip():
-                chunks.append(current)
-            # First chunk uses original header
-            chunks[0] = "📊 *All User Activity Summary:*\n\n" + chunks[0].split("\n\n", 1)[-1]
-            for chunk in chunks:
-                await update.message.reply_text(chunk, parse_mode="Markdown")
+        chunks = []
+        current = [header]
+        current_len = len(header)
+        for block in blocks:
+            if current_len + len(block) > max_len:
+                chunks.append("".join(current))
+                current = [continued_header, block]
+                current_len = len(continued_header) + len(block)
+            else:
+                current.append(block)
+                current_len += len(block)
+        chunks.append("".join(current))
+
+        for chunk in chunks:
+            await update.message.reply_text(chunk, parse_mode="Markdown")
 
     except Exception as e:
-        print(f"⚠️ Error generating stats: {e}")
+        logger.warning("⚠️ Error generating stats: %s", e)
         await update.message.reply_text("⚠️ Could not retrieve stats.")
 
 # ----------------- Announce (admin) -----------------
@@ -828,10 +1172,10 @@ async def send_announcement(update: Update, context: ContextTypes.DEFAULT_TYPE):
             parse_mode="Markdown"
         )
         await update.message.reply_text("✅ Announcement sent successfully!")
-        print(f"✅ Admin sent announcement: {message_text}")
+        logger.info("✅ Admin sent announcement: %s", message_text)
     except Exception as e:
         await update.message.reply_text("⚠️ Failed to send announcement.")
-        print(f"⚠️ Announcement error: {e}")
+        logger.warning("⚠️ Announcement error: %s", e)
 
     return ConversationHandler.END
 
@@ -875,17 +1219,17 @@ async def receive_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
         file = await document.get_file()
         await file.download_to_drive(file_path)
         await update.message.reply_text(f"✅ File saved: {safe_name}\nUsers can now access it with /docs.")
-        print(f"✅ Admin uploaded {safe_name} to docs/")
+        logger.info("✅ Admin uploaded %s to docs/", safe_name)
     except Exception as e:
         await update.message.reply_text("⚠️ Failed to save the file.")
-        print(f"⚠️ Error saving file: {e}")
+        logger.warning("⚠️ Error saving file: %s", e)
 
     return ConversationHandler.END
 
 
 async def topdf_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.message.from_user
-    await log_user_action(user, "/topdf")
+    log_user_action(user, "/topdf")
     await update.message.reply_text(
         "📝 Please type the output PDF file name first (example: meeting_report).\n"
         "I will add .pdf automatically.",
@@ -979,10 +1323,8 @@ async def receive_file_for_pdf(update: Update, context: ContextTypes.DEFAULT_TYP
             return CONVERT_TO_PDF
 
         pdf_name = context.user_data.get("topdf_output_name") or f"{os.path.splitext(source_name)[0]}.pdf"
-        with open(pdf_path, "rb") as f:
-            await message.reply_document(
-                document=InputFile(f, filename=pdf_name),
-            )
+        pdf_bytes = await asyncio.to_thread(_read_file_bytes, pdf_path)
+        await message.reply_document(document=pdf_bytes, filename=pdf_name)
 
     context.user_data.pop("topdf_output_name", None)
     return ConversationHandler.END
@@ -990,14 +1332,27 @@ async def receive_file_for_pdf(update: Update, context: ContextTypes.DEFAULT_TYP
 # ----------------- User Download Docs (Inline Keyboard) -----------------
 
 
-async def docs_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user = update.message.from_user
-    await log_user_action(user, "/docs")
+# Listing of docs/, refreshed only when the directory's mtime changes (e.g. after /uploaddoc)
+docs_cache = {"mtime": None, "files": []}
+
 
+def list_docs() -> list[str]:
+    """Return the downloadable files in docs/, re-listing only after the directory changes."""
     try:
-        files = [f for f in os.listdir("docs") if f != ".keep"]
+        mtime = os.stat("docs").st_mtime_ns
+        if mtime != docs_cache["mtime"]:
+            docs_cache["files"] = [f for f in os.listdir("docs") if f != ".keep"]
+            docs_cache["mtime"] = mtime
     except Exception:
-        files = []
+        return []
+    return docs_cache["files"]
+
+
+async def docs_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user = update.message.from_user
+    log_user_action(user, "/docs")
+
+    files = list_docs()
 
     if not files:
         await update.message.reply_text("📂 No documents available yet. Ask the admin to upload some.")
@@ -1038,19 +1393,105 @@ async def handle_docs_button(update: Update, context: ContextTypes.DEFAULT_TYPE)
         return
 
     try:
-        with open(file_path, "rb") as f:
-            await query.message.reply_document(
-                document=InputFile(f, filename=filename),
-                caption=f"📘 Here’s your document: {filename}"
-            )
-        print(f"✅ Sent {filename} to {query.from_user.first_name}")
+        content = await asyncio.to_thread(_read_file_bytes, file_path)
+        await query.message.reply_document(
+            document=content,
+            filename=filename,
+            caption=f"📘 Here’s your document: {filename}"
+        )
+        logger.info("✅ Sent %s to %s", filename, query.from_user.first_name)
     except Exception as e:
         await query.message.reply_text("⚠️ Failed to send the document.")
-        print(f"⚠️ Error sending document: {e}")
+        logger.warning("⚠️ Error sending document: %s", e)
 
 # ----------------- Auto Cleanup -----------------
 
 
+def _coalesce_rows(row_numbers: list[int]) -> list[tuple[int, int]]:
+    """Group ascending sheet row numbers into inclusive (first, last) runs."""
+    runs = []
+    for n in row_numbers:
+        if runs and runs[-1][1] == n - 1:
+            runs[-1] = (runs[-1][0], n)
+        else:
+            runs.append((n, n))
+    return runs
+
+
+def _classify_expired(records: list[Booking], due_keys: set) -> tuple[list[int], list[str]]:
+    """Return the indices and 'Date | Time' labels of records whose (date, time, id) is due."""
+    expired = [
+        i for i, (d, t, _, tid) in enumerate(records) if (d, t, tid) in due_keys
+    ]
+    return expired, [f"{records[i].date} | {records[i].time}" for i in expired]
+
+
+def _remove_expired_sync(now: datetime) -> list[str]:
+    """Delete bookings that ended before now from the sheet and mirror."""
+    now_ts = int(now.timestamp())
+
+    with sheet_write_lock:
+        with bookings_lock:
+            if not expiry_heap or expiry_heap[0][0] >= now_ts:
+                return []
+
+        # Something is due: re-read the sheet so row positions reflect manual edits, then
+        # pop the rebuilt heap. Matching runs outside bookings_lock so readers aren't blocked;
+        # the mirror cannot change while sheet_write_lock is held.
+        records = _resync_bookings()
+        with bookings_lock:
+            due_keys = set()
+            while expiry_heap and expiry_heap[0][0] < now_ts:
+                due_keys.add(heapq.heappop(expiry_heap)[1:])
+        expired, removed = _classify_expired(records, due_keys)
+
+        if not expired:
+            return []
+
+        # One batchUpdate; delete bottom-up so earlier ranges keep their indices
+        requests = [
+            {
+                "deleteDimension": {
+                    "range": {
+                        "sheetId": services.sheet.id,
+                        "dimension": "ROWS",
+                        "startIndex": first - 1,
+                        "endIndex": last,
+                    }
+                }
+            }
+            for first, last in reversed(_coalesce_rows([i + 2 for i in expired]))
+        ]
+        # If this raises, the popped entries come back with the next refresh_bookings
+        services.spreadsheet.batch_update({"requests": requests})
+
+        with bookings_lock:
+            for i in reversed(expired):
+                _unindex_booking(bookings.pop(i))
+            schedule_cache["dirty"] = True
+        logger.info("✅ Deleted %s expired rows from the sheet.", len(expired))
+
+    return removed
+
+
+def schedule_next_cleanup(job_queue: JobQueue):
+    """(Re)arm the single auto_cleanup run for just after the earliest booking end; none if idle."""
+    with bookings_lock:
+        next_ts = expiry_heap[0][0] if expiry_heap else None
+
+    min_delay = 1
+    failures = cleanup_state["failures"]
+    if failures:
+        # A due booking stays overdue while Sheets fails, so back off instead of retrying every second
+        min_delay = min(CLEANUP_RETRY_DELAY * 2 ** min(failures - 1, 8), CLEANUP_MAX_DELAY)
+
+    for job in job_queue.get_jobs_by_name("auto_cleanup"):
+        job.schedule_removal()
+    if next_ts is not None:
+        delay = max(next_ts - datetime.now(TZ).timestamp() + 1, min_delay)
+        job_queue.run_once(auto_cleanup, when=delay, name="auto_cleanup")
+
+
 async def auto_cleanup(update: Update = None, context: ContextTypes.DEFAULT_TYPE = None):
     """
     Works both when called manually (update + context) and when called by JobQueue
@@ -1061,106 +1502,96 @@ async def auto_cleanup(update: Update = None, context: ContextTypes.DEFAULT_TYPE
         context = update
         update = None
 
-    tz = ZoneInfo("Asia/Phnom_Penh")
-    now = datetime.now(tz)
+    now = datetime.now(TZ)
     try:
-        records = sheet.get_all_records()
+        removed = await asyncio.to_thread(_remove_expired_sync, now)
     except Exception as e:
-        print(f"⚠️ auto_cleanup: could not fetch sheet records: {e}")
+        cleanup_state["failures"] += 1
+        failures = cleanup_state["failures"]
+        logger.warning("⚠️ Error rewriting sheet (failure %s in a row): %s", failures, e)
+        if context and context.job_queue:
+            schedule_next_cleanup(context.job_queue)
+        if update and getattr(update, "message", None):
+            await update.message.reply_text("⚠️ Cleanup failed due to a sheet update error.")
+        elif context and failures == 1:
+            # Tell the group once per outage, not on every retry
+            await context.bot.send_message(
+                chat_id=GROUP_CHAT_ID,
+                text="⚠️ Cleanup failed due to a sheet update error.",
+                parse_mode="Markdown"
+            )
         return
 
-    removed = []
-    updated_records = []
-
-    for row in records:
-        try:
-            date_str = row["Date"]
-            time_str = row["Time"]
-            name = row["Name"]
+    cleanup_state["failures"] = 0
+    if context and context.job_queue:
+        schedule_next_cleanup(context.job_queue)
 
-            start_time_str, end_time_str = time_str.split("-")
-            meeting_end = datetime.strptime(
-                f"{date_str} {end_time_str.strip()}", "%d/%m/%Y %H:%M")
-            meeting_end = meeting_end.replace(tzinfo=tz)
+    if removed:
+        parts = ["🧹 *Expired Schedule:*\n"]
+        parts.extend(f"• {r}\n" for r in removed)
 
-            if meeting_end < now:
-                removed.append(f"{date_str} | {time_str}")
-            else:
-                updated_records.append(row)
-        except Exception as e:
-            print(f"⚠️ Error parsing record: {e}")
+        schedule = render_schedule()
+        if schedule:
+            parts.append("\n📋 *Updated Schedule:*\n")
+            parts.append(schedule)
+        else:
+            parts.append("\n✅ No meetings left.")
+        message = "".join(parts)
 
-    if removed:
         try:
-            headers = ["Date", "Time", "Name", "TelegramID"]
-            await asyncio.to_thread(sheet.clear)
-
-            new_data = [headers]
-            for r in updated_records:
-                new_data.append([
-                    r.get("Date", ""),
-                    r.get("Time", ""),
-                    r.get("Name", ""),
-                    r.get("TelegramID", "")
-                ])
-
-            await asyncio.to_thread(sheet.update, new_data, "A1")
-            print("✅ Sheet successfully rewritten with updated records.")
-
-            message = "🧹 *Expired Schedule:*\n"
-            for r in removed:
-                message += f"• {r}\n"
-
-            if updated_records:
-                updated_records.sort(key=sort_key)
-                message += "\n📋 *Updated Schedule:*\n"
-                for row in updated_records:
-                    message += f"{row['Date']} | {row['Time']} | {row['Name']}\n"
-            else:
-                message += "\n✅ No meetings left."
-
             if context:
                 await context.bot.send_message(chat_id=GROUP_CHAT_ID, text=message, parse_mode="Markdown")
 
             if update and getattr(update, "message", None):
                 await update.message.reply_text("✅ Cleanup completed and group updated!")
-
         except Exception as e:
-            print(f"⚠️ Error rewriting sheet: {e}")
-            if update and getattr(update, "message", None):
-                await update.message.reply_text("⚠️ Cleanup failed due to a sheet update error.")
-            elif context:
-                await context.bot.send_message(
-                    chat_id=GROUP_CHAT_ID,
-                    text="⚠️ Cleanup failed due to a sheet update error.",
-                    parse_mode="Markdown"
-                )
+            logger.warning("⚠️ Could not send cleanup message: %s", e)
     else:
-        print("✅ No expired meetings found during cleanup.")
+        logger.info("✅ No expired meetings found during cleanup.")
         if update and getattr(update, "message", None):
             await update.message.reply_text("✨ There are no expired bookings to clean up.")
 
-# ----------------- Webhook utils & admin notify -----------------
+
+async def refresh_bookings(context: ContextTypes.DEFAULT_TYPE):
+    """Re-sync the in-memory bookings with the sheet so manual edits are picked up."""
+    try:
+        await asyncio.to_thread(reload_bookings)
+    except Exception as e:
+        logger.warning("⚠️ Could not refresh bookings from sheet: %s", e)
+        return
+    # Manual edits may have added an earlier end time
+    schedule_next_cleanup(context.job_queue)
+
+# ----------------- Admin notify -----------------
 
 
-async def clear_webhook(bot_token):
-    """Ensure the bot is in polling mode (not webhook)."""
-    bot = Bot(bot_token)
-    await bot.delete_webhook(drop_pending_updates=True)
-    print("✅ Webhook cleared successfully!")
+# Bot of the running Application, reused for the crash alert instead of a fresh Bot()
+app_bot: dict = {}
 
 
 async def notify_admin(bot, message: str):
     """Send a notification message to the admin."""
     try:
         await bot.send_message(chat_id=ADMIN_ID, text=f"⚠️ [Bot Alert]\n\n{message}")
-        print(f"✅ Sent alert to admin: {message}")
+        logger.info("✅ Sent alert to admin: %s", message)
     except Exception as e:
-        print(f"⚠️ Failed to notify admin: {e}")
+        logger.warning("⚠️ Failed to notify admin: %s", e)
+
+
+async def notify_admin_after_crash(message: str):
+    """Alert the admin once the Application has stopped, reopening its bot's connection pool."""
+    bot = app_bot.get("bot") or Bot(token=TOKEN)
+    async with bot:
+        await notify_admin(bot, message)
 
 # ----------------- Generic conversation cancel fallback -----------------
 
 
+async def handle_stale_cancel_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Answer /cancel buttons tapped after their conversation ended, so they don't spin."""
+    await update.callback_query.answer("⚠️ This menu has expired. Run /cancel again.", show_alert=True)
+
+
 async def conv_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await _delete_booking_prompt(context)
     await update.message.reply_text("↩️ Conversation cancelled.", reply_markup=ReplyKeyboardRemove())
@@ -1179,9 +1610,9 @@ async def welcome_new_member(update: Update, context: ContextTypes.DEFAULT_TYPE)
         )
         try:
             await update.message.reply_text(welcome_msg)
-            print(f"✅ Welcomed new member: {new_member.first_name}")
+            logger.info("✅ Welcomed new member: %s", new_member.first_name)
         except Exception as e:
-            print(f"⚠️ Could not send welcome message: {e}")
+            logger.warning("⚠️ Could not send welcome message: %s", e)
 
 async def handle_cancel_info_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Send cancellation details privately to whoever taps the 'Who cancelled?' button."""
@@ -1200,7 +1631,7 @@ async def handle_cancel_info_button(update: Update, context: ContextTypes.DEFAUL
         return
 
     tapper = query.from_user
-    await log_user_action(tapper, "/cancel_info")
+    log_user_action(tapper, "/cancel_info")
     private_message = (
         f"🗑️ *Cancellation Details:*\n\n"
         f"👤 Cancelled by: *{details['name']}*\n"
@@ -1225,7 +1656,7 @@ async def handle_cancel_info_button(update: Update, context: ContextTypes.DEFAUL
             "⚠️ Please start the bot privately first, then try again.",
             show_alert=True,
         )
-        print(f"⚠️ Could not send cancel detail to {tapper.first_name}: {e}")
+        logger.warning("⚠️ Could not send cancel detail to %s: %s", tapper.first_name, e)
 
 
 async def handle_take_slot_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -1250,10 +1681,8 @@ async def handle_take_slot_button(update: Update, context: ContextTypes.DEFAULT_
 
     # Check if the slot has already expired
     try:
-        tz = ZoneInfo("Asia/Phnom_Penh")
-        start_str = time_str.split("-")[0].strip()
-        slot_start = datetime.strptime(f"{date_str} {start_str}", "%d/%m/%Y %H:%M").replace(tzinfo=tz)
-        if slot_start < datetime.now(tz):
+        start_ts = local_timestamp(date_str, time_to_minutes(time_str.split("-")[0].strip()))
+        if start_ts < datetime.now(TZ).timestamp():
             await query.answer("⏰ This slot has already expired and cannot be booked.", show_alert=True)
             return
     except Exception:
@@ -1270,52 +1699,40 @@ async def handle_take_slot_button(update: Update, context: ContextTypes.DEFAULT_
         await query.answer("❌ Could not book this slot. Invalid time format.", show_alert=True)
         return
 
-    await log_user_action(taker, "/take_slot")
+    log_user_action(taker, "/take_slot")
 
     # Remove slot from store so it can't be double-booked via this button
     cancel_details_store.pop(detail_key, None)
 
-    # Edit the private message to confirm
-    try:
-        await query.edit_message_text(
+    schedule_next_cleanup(context.job_queue)
+    schedule_booking_announcement(context, taker.first_name, date_str, time_str)
+
+    # Confirm in the private message; a failed edit is ignored as before
+    await asyncio.gather(
+        query.edit_message_text(
             f"✅ *Slot booked successfully!*\n\n"
             f"📅 {date_str} | ⏰ {time_str}",
             parse_mode="Markdown",
-        )
-    except Exception:
-        pass
-
-    await query.answer("✅ Slot booked!", show_alert=False)
-
-    # Announce new booking to group with updated schedule
-    try:
-        records = await asyncio.to_thread(sheet.get_all_records)
-        records.sort(key=sort_key)
-
-        group_message = (
-            f"📢 *New Booking Added!*\n\n"
-            f"👤 {taker.first_name}\n"
-            f"🗓 {date_str} | ⏰ {time_str}\n\n"
-            f"📋 *Current Schedule:*\n"
-        )
-        for row in records:
-            group_message += f"{row['Date']} | {row['Time']} | {row['Name']}\n"
-
-        await context.bot.send_message(
-            chat_id=GROUP_CHAT_ID,
-            text=group_message,
-            parse_mode="Markdown",
-        )
-    except Exception as e:
-        print(f"⚠️ Could not send group message for taken slot: {e}")
+        ),
+        query.answer("✅ Slot booked!", show_alert=False),
+        return_exceptions=True,
+    )
 
 # ===================== MAIN =====================
 
 
 def main():
 
-    request = HTTPXRequest(connect_timeout=30.0, read_timeout=120.0)
+    # HTTP/2 multiplexes replies, group broadcasts and alerts over one pooled connection
+    request = HTTPXRequest(
+        connection_pool_size=64,
+        pool_timeout=5.0,
+        connect_timeout=30.0,
+        read_timeout=120.0,
+        http_version="2",
+    )
     app = ApplicationBuilder().token(TOKEN).request(request).build()
+    app_bot["bot"] = app.bot
 
     # Initialize job queue if needed
     job_queue = getattr(app, "job_queue", None)
@@ -1324,9 +1741,9 @@ def main():
             job_queue = JobQueue()
             job_queue.set_application(app)
             job_queue.start()
-            print("✅ Job queue manually initialized.")
+            logger.info("✅ Job queue manually initialized.")
         except Exception as e:
-            print(f"⚠️ Could not initialize job queue: {e}")
+            logger.warning("⚠️ Could not initialize job queue: %s", e)
 
     # Define commands
     user_commands = [
@@ -1334,6 +1751,7 @@ def main():
         BotCommand("book", "Book room"),
         BotCommand("cancel", "Cancel booking"),
         BotCommand("end", "End the meeting"),
+        BotCommand("available", "Show booked times"),
         BotCommand("docs", "Download documents"),
         BotCommand("topdf", "Convert file to PDF"),
     ]
@@ -1349,12 +1767,16 @@ def main():
     async def set_commands(application):
         await application.bot.set_my_commands(user_commands, scope=BotCommandScopeDefault())
         await application.bot.set_my_commands(admin_commands, scope=BotCommandScopeChat(ADMIN_ID))
-        print("✅ Command menus set for users and admin.")
+        logger.info("✅ Command menus set for users and admin.")
 
-        # Clear webhook safely
-        await clear_webhook(TOKEN)
+    async def post_init(application):
+        # Sheets are opened and the in-memory state seeded here, not at import
+        await asyncio.to_thread(reload_bookings)
+        await asyncio.to_thread(load_stats_summary)
+        await set_commands(application)
 
-    app.post_init = set_commands
+    app.post_init = post_init
+    app.post_shutdown = flush_logs
 
     # Conversations
     fallback_list = [CommandHandler("cancel", conv_cancel)]
@@ -1377,9 +1799,10 @@ def main():
     cancel_conv = ConversationHandler(
         entry_points=[CommandHandler("cancel", cancel)],
         states={
-            CANCEL_SELECT: [MessageHandler(filters.TEXT & ~filters.COMMAND, delete_booking_by_number)],
+            CANCEL_SELECT: [CallbackQueryHandler(handle_cancel_selection, pattern="^cancel:")],
         },
         fallbacks=fallback_list,
+        conversation_timeout=300,
         per_chat=True,
         per_user=True,
     )
@@ -1421,6 +1844,7 @@ def main():
     app.add_handler(book_conv)
     app.add_handler(cancel_conv)
     app.add_handler(CommandHandler("end", end_meeting))
+    app.add_handler(CommandHandler("available", available))
     app.add_handler(announce_conv)
     app.add_handler(CommandHandler("clean", auto_cleanup))
     app.add_handler(upload_conv)
@@ -1429,14 +1853,26 @@ def main():
     app.add_handler(CallbackQueryHandler(handle_docs_button, pattern="^docs:"))
     app.add_handler(CallbackQueryHandler(handle_cancel_info_button, pattern="^cancel_info:"))
     app.add_handler(CallbackQueryHandler(handle_take_slot_button, pattern="^take_slot:"))
+    # Reached only when cancel_conv is not waiting for this user (timed out or already used)
+    app.add_handler(CallbackQueryHandler(handle_stale_cancel_button, pattern="^cancel:"))
     app.add_handler(MessageHandler(
         filters.StatusUpdate.NEW_CHAT_MEMBERS, welcome_new_member))
 
-    # Schedule auto cleanup every hour
-    job_queue.run_repeating(auto_cleanup, interval=3600, first=10)
-    print("🕒 Auto-cleanup scheduled every 1 hour.")
+    # First cleanup shortly after boot; each run, new booking and refresh then re-arms
+    # it for the next booking end, so nothing runs while no booking is due
+    job_queue.run_once(auto_cleanup, when=10, name="auto_cleanup")
+    logger.info("🕒 Auto-cleanup scheduled for each booking end.")
+
+    # Re-sync the in-memory bookings with the sheet every 10 minutes
+    job_queue.run_repeating(refresh_bookings, interval=600, first=600)
+
+    # Write buffered user-action logs to the sheet in batches
+    job_queue.run_repeating(flush_logs, interval=30, first=30)
 
-    use_webhook = os.getenv("USE_WEBHOOK", "false").lower() == "true"
+    # Webhooks are the default whenever a public URL is configured;
+    # run_polling() removes any registered webhook itself.
+    default_webhook = "true" if os.getenv("WEBHOOK_URL") else "false"
+    use_webhook = os.getenv("USE_WEBHOOK", default_webhook).lower() == "true"
     if use_webhook:
         webhook_url = os.getenv("WEBHOOK_URL")
         webapp_host = os.getenv("WEBAPP_HOST", "0.0.0.0")
@@ -1449,8 +1885,8 @@ def main():
             raise RuntimeError(
                 "USE_WEBHOOK=true but WEBHOOK_URL is not set in .env")
 
-        print(
-            f"✅ Starting webhook at {webapp_host}:{webapp_port} -> {webhook_url}")
+        logger.info(
+            "✅ Starting webhook at %s:%s -> %s", webapp_host, webapp_port, webhook_url)
 
         app.run_webhook(
             listen=webapp_host,
@@ -1459,16 +1895,16 @@ def main():
             secret_token=secret_token,
         )
     else:
-        print("✅ Meeting Room Bot is running (polling)...")
+        logger.info("✅ Meeting Room Bot is running (polling)...")
         try:
             # Drop any pending updates to avoid conflicts from previous runs
             app.run_polling(drop_pending_updates=True)
         except Exception as e:
             # Handle duplicate polling conflicts gracefully
             if "terminated by other getUpdates request" in str(e):
-                print(
+                logger.warning(
                     "⚠️ Conflict: Another bot instance is polling. Please stop other running processes and run a single instance.")
-                print(
+                logger.warning(
                     "Hint: In PowerShell, run: Get-Process python* | Stop-Process -Force")
             raise
 
@@ -1477,14 +1913,12 @@ if __name__ == "__main__":
     try:
         main()
     except Exception as e:
-        print(f"❌ BOT ERROR: {e}")
+        logger.error("❌ BOT ERROR: %s", e)
         try:
             loop = asyncio.new_event_loop()
             asyncio.set_event_loop(loop)
-            bot = Bot(token=TOKEN)
             loop.run_until_complete(
-                notify_admin(
-                    bot, f"⚠️ [Bot Alert]\n\nBot stopped or crashed.\nError: {e}")
+                notify_admin_after_crash(f"⚠️ [Bot Alert]\n\nBot stopped or crashed.\nError: {e}")
             )
         except Exception as inner_e:
-            print(f"⚠️ Failed to send crash alert: {inner_e}")
+            logger.warning("⚠️ Failed to send crash alert: %s", inner_e)